@@ -24,7 +24,7 @@ simulation_parameters = [
     # (9, 1, 1000),
     # (9, 2, 1000),
     (25, 1, 2000),
-    # (25, 2, 2000),
+    (25, 2, 2000),
     # (64, 1, 4000),
     # (64, 2, 4000)
 ]
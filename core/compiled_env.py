@@ -0,0 +1,205 @@
+import numpy as np
+
+from constants import actions, movement
+
+
+# Integer action codes, in the order of constants.actions
+ACTION_CODES = {action: code for code, action in enumerate(actions)}
+UP, DOWN, LEFT, RIGHT = (ACTION_CODES[a] for a in ('up', 'down', 'left', 'right'))
+PICK_UP, DELIVER, STAY, REJECT = (ACTION_CODES[a] for a in ('pick-up', 'deliver', 'stay', 'reject'))
+MOVES = (UP, DOWN, LEFT, RIGHT)
+
+# Order phases of a courier, i.e. the parts of its order's state that
+# take_action depends on: the order status and whether it was picked up
+NO_ORDER = 0     # no order assigned
+ASSIGNED = 1     # status 'assigned', not picked up, courier has not moved yet
+TO_ORIGIN = 2    # status 'in_transit', not picked up
+CARRYING = 3     # status 'in_transit', picked up
+REASSIGNED = 4   # status 'assigned', picked up before and then rejected
+NUM_PHASES = 5
+
+BLOCKED_MOVE_REWARD = -0.5
+
+
+def order_phase(courier):
+    '''
+    Returns the order phase of a courier.
+    '''
+    order = courier.current_order
+    if not order:
+        return NO_ORDER
+    if order.status == 'assigned':
+        return REASSIGNED if order.assigned else ASSIGNED
+    if order.status == 'in_transit':
+        return CARRYING if order.assigned else TO_ORIGIN
+    raise ValueError(f"Courier holds an order with unexpected status '{order.status}'")
+
+
+class CompiledGrid:
+    '''
+    Precomputed transition and reward tables of the environment for one grid.
+
+    Locations are cell indices x * m + y and actions are integer codes, so
+    a step is a handful of array lookups instead of the string dispatch,
+    boundary checks and reward arithmetic of take_action:
+
+    * next_location[location, action]: location after the action, clamped
+      to the grid.
+    * blocked[location, action]: 1 for moves that would leave the grid.
+    * reward[phase, at_origin, at_destination, blocked, action]
+    * next_phase[phase, at_origin, at_destination, action]
+
+    The tables reproduce take_action exactly; misc/check_compiled_env.py
+    verifies this against take_action on random states.
+    '''
+    def __init__(self, m):
+        self.m = m
+        self.cells = [(x, y) for x in range(m) for y in range(m)]
+
+        num_cells = m ** 2
+        num_actions = len(actions)
+
+        # Next location with boundary clamping
+        self.next_location = np.tile(np.arange(num_cells)[:, None], (1, num_actions))
+        self.blocked = np.zeros((num_cells, num_actions), dtype=np.int8)
+        for cell, (x, y) in enumerate(self.cells):
+            for action in MOVES:
+                dx, dy = movement[actions[action]]
+                new_x, new_y = x + dx, y + dy
+                if 0 <= new_x < m and 0 <= new_y < m:
+                    self.next_location[cell, action] = new_x * m + new_y
+                else:
+                    self.blocked[cell, action] = 1
+
+        self.reward = np.zeros((NUM_PHASES, 2, 2, 2, num_actions), dtype=np.float64)
+        self.next_phase = np.zeros((NUM_PHASES, 2, 2, num_actions), dtype=np.int8)
+
+        for phase in range(NUM_PHASES):
+            has_order = phase != NO_ORDER
+            picked_up = phase in (CARRYING, REASSIGNED)
+            in_transit = phase in (TO_ORIGIN, CARRYING)
+
+            for at_origin in (0, 1):
+                for at_destination in (0, 1):
+                    rewards = self.reward[phase, at_origin, at_destination]
+                    phases = self.next_phase[phase, at_origin, at_destination]
+                    phases[:] = phase
+
+                    # Movement: -1 if carrying an order, else -0.1; -0.5 if blocked
+                    for action in MOVES:
+                        rewards[0, action] = -1 if has_order else -0.1
+                        rewards[1, action] = BLOCKED_MOVE_REWARD
+                        # Moving after assignment puts the order in transit
+                        if phase == ASSIGNED:
+                            phases[action] = TO_ORIGIN
+                        elif phase == REASSIGNED:
+                            phases[action] = CARRYING
+
+                    # Pick-up
+                    if has_order and at_origin:
+                        rewards[:, PICK_UP] = -(m ** 2) if picked_up else m ** 2
+                        if not picked_up:
+                            phases[PICK_UP] = CARRYING
+                    else:
+                        rewards[:, PICK_UP] = -m
+
+                    # Deliver
+                    if has_order and at_destination:
+                        rewards[:, DELIVER] = m ** 2
+                        phases[DELIVER] = NO_ORDER
+                    else:
+                        rewards[:, DELIVER] = -(m ** 2)
+
+                    # Stay
+                    rewards[:, STAY] = -(m ** 2) if has_order else 0
+
+                    # Reject
+                    rewards[:, REJECT] = -(m ** 2) if in_transit else -m / 3
+                    phases[REJECT] = NO_ORDER
+
+        # Nested-list copies of the tables; indexing them from Python is much
+        # cheaper than indexing numpy arrays one scalar at a time
+        self._next_location = self.next_location.tolist()
+        self._blocked = self.blocked.tolist()
+        self._reward = self.reward.tolist()
+        self._next_phase = self.next_phase.tolist()
+
+    def step(self, location, origin, destination, phase, action):
+        '''
+        Computes one transition on integer codes.
+
+        Parameters:
+        - location (int): Courier cell index.
+        - origin (int), destination (int): Cell indices of the order, -1 if none.
+        - phase (int): Order phase of the courier.
+        - action (int): Action code.
+
+        Returns:
+        - next_location (int), next_phase (int), reward (float)
+        '''
+        at_origin = int(location == origin)
+        at_destination = int(location == destination)
+        return (
+            self._next_location[location][action],
+            self._next_phase[phase][at_origin][at_destination][action],
+            self._reward[phase][at_origin][at_destination][self._blocked[location][action]][action]
+        )
+
+    def cell(self, location):
+        '''
+        Returns the cell index of an (x, y) location, or -1 for None.
+        '''
+        return -1 if location is None else location[0] * self.m + location[1]
+
+
+def take_action_compiled(courier, action, order_list, grid):
+    '''
+    Drop-in replacement for take_action that uses the precomputed tables.
+
+    Parameters:
+    - courier: A Courier instance.
+    - action (int): Action code (see ACTION_CODES).
+    - order_list: A list of Order objects.
+    - grid (CompiledGrid): Tables of the grid the courier moves on.
+
+    Returns:
+    - next_state, reward: Same as take_action.
+    '''
+    order = courier.current_order
+    phase = order_phase(courier)
+    location = courier.location[0] * grid.m + courier.location[1]
+
+    if order:
+        next_location, next_phase, reward = grid.step(
+            location, grid.cell(order.origin), grid.cell(order.destination), phase, action
+        )
+    else:
+        next_location, next_phase, reward = grid.step(location, -1, -1, phase, action)
+
+    courier.location = grid.cells[next_location]
+
+    # Apply the side effects on the courier and its order
+    if next_phase != phase:
+        if next_phase == NO_ORDER:
+            courier.is_busy = False
+            courier.current_order = None
+            if action == DELIVER:
+                if order in order_list:
+                    order_list.remove(order)
+            else:
+                # Rejected; put order back in the waiting list
+                order.status = 'pending'
+        elif action == PICK_UP:
+            courier.is_busy = True
+            order.assigned = True
+            order.status = 'in_transit'
+        else:
+            order.status = 'in_transit'
+
+    next_state = (
+        courier.location,
+        courier.current_order.origin if courier.current_order else None,
+        courier.current_order.destination if courier.current_order else None
+    )
+
+    return next_state, reward
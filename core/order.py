@@ -14,4 +14,5 @@ class Order:
         self.origin = origin  # (x, y)
         self.destination = destination  # (x, y)
         self.patience = patience
-        self.status = 'pending'  # 'pending', 'in_transit', 'assigned'
\ No newline at end of file
+        self.status = 'pending'  # 'pending', 'in_transit', 'assigned'
+        self.assigned = False  # True once the order has been picked up from its origin
\ No newline at end of file
@@ -0,0 +1,155 @@
+import time
+import json
+import asyncio
+import logging
+import argparse
+
+import numpy as np
+
+from constants import movement
+from utils.order_utils import generate_orders
+from utils.rng import RandomStream
+from logger_config import setup_logging
+
+
+_seq = 0
+
+
+def next_seq():
+    global _seq
+    _seq += 1
+    return _seq
+
+
+# Round-trip latencies (seconds) of decision events
+latencies = []
+
+
+async def send(reader, writer, pending, event):
+    future = asyncio.get_running_loop().create_future()
+    pending[event['seq']] = (future, time.perf_counter(), event['type'])
+    writer.write((json.dumps(event) + '\n').encode())
+    await writer.drain()
+    return await future
+
+
+async def read_replies(reader, pending):
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+
+        reply = json.loads(line)
+        entry = pending.pop(reply.get('seq'), None)
+        if entry is None:
+            continue
+
+        future, sent_at, event_type = entry
+        if event_type == 'courier_position':
+            latencies.append(time.perf_counter() - sent_at)
+        future.set_result(reply)
+
+
+async def run_courier(courier_id, location, reader, writer, pending, m, num_events, interval):
+    '''
+    Sends position updates for one courier, starting at location, and follows the returned actions.
+    '''
+    for _ in range(num_events):
+        seq = next_seq()
+        event = {'type': 'courier_position', 'seq': seq, 'courier_id': courier_id, 'location': list(location)}
+        reply = await send(reader, writer, pending, event)
+
+        # Move like the courier would, so that the policy sees realistic states
+        if reply.get('action') in movement:
+            dx, dy = movement[reply['action']]
+            new_x, new_y = location[0] + dx, location[1] + dy
+            if 0 <= new_x < m and 0 <= new_y < m:
+                location = (new_x, new_y)
+
+        await asyncio.sleep(interval)
+
+
+async def run_order_stream(reader, writer, pending, m, num_orders, interval, rng=None):
+    '''
+    Sends order-created events drawn from the simulation's order distribution.
+    '''
+    for idx, order in enumerate(generate_orders(num_orders, m, patience=10, rng=rng)):
+        event = {
+            'type': 'order_created',
+            'seq': next_seq(),
+            'order_id': f"o{idx}",
+            'origin': list(order.origin),
+            'destination': list(order.destination),
+            'patience': order.patience
+        }
+        await send(reader, writer, pending, event)
+        await asyncio.sleep(interval)
+
+
+async def generate_load(host='127.0.0.1', port=8765, m=5, num_couriers=50, events_per_courier=200,
+                        num_orders=500, interval=0.001, seed=None):
+    '''
+    Drives a running dispatch server and reports decision latency.
+
+    Parameters:
+    - host (str), port (int): Address of the dispatch server.
+    - m (int): Grid length the served policy was trained on.
+    - num_couriers (int): Number of simulated couriers sending positions concurrently.
+    - events_per_courier (int): Position updates sent by each courier.
+    - num_orders (int): Number of order-created events to send.
+    - interval (float): Pause between two events of the same sender in seconds.
+    - seed (int): Seed of the orders and of the courier start cells. Together
+      with the server's --seed it makes the sent events reproducible.
+
+    Returns:
+    - report: Dictionary with throughput and p50/p99 decision latency (ms).
+    '''
+    reader, writer = await asyncio.open_connection(host, port)
+    pending = {}
+    reply_reader = asyncio.create_task(read_replies(reader, pending))
+
+    order_stream, courier_stream = RandomStream(seed).spawn(2)
+    start_cells = [(courier_stream.integer(m), courier_stream.integer(m)) for _ in range(num_couriers)]
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        run_order_stream(reader, writer, pending, m, num_orders, interval, order_stream),
+        *[
+            run_courier(f"c{idx}", start_cells[idx], reader, writer, pending, m, events_per_courier, interval)
+            for idx in range(num_couriers)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+
+    reply_reader.cancel()
+    writer.close()
+
+    latencies_ms = np.array(latencies) * 1000
+    report = {
+        'Decisions': len(latencies),
+        'Decisions/sec': len(latencies) / elapsed,
+        'p50 Decision Latency (ms)': float(np.percentile(latencies_ms, 50)),
+        'p99 Decision Latency (ms)': float(np.percentile(latencies_ms, 99))
+    }
+
+    logging.getLogger('LoadGenerator').info(f"Load generator result: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local load generator for the dispatch server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--m', type=int, default=5)
+    parser.add_argument('--couriers', type=int, default=50)
+    parser.add_argument('--events', type=int, default=200, help="Position updates per courier.")
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--interval', type=float, default=0.001)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    setup_logging(log_file='load_generator.log')
+    logging.getLogger().setLevel(logging.INFO)
+
+    asyncio.run(generate_load(args.host, args.port, args.m, args.couriers, args.events, args.orders, args.interval,
+                               args.seed))
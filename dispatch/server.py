@@ -0,0 +1,332 @@
+import time
+import json
+import asyncio
+import logging
+import argparse
+
+import numpy as np
+
+from core.order import Order
+from core.courier import Courier
+from core.action import take_action
+from learning.policy import greedy_actions
+from utils.general_utils import load_q_table
+from utils.order_utils import assign_order_to_courier, update_order_patience
+from utils.rng import RandomStream
+from logger_config import setup_logging
+
+
+class DispatchServer:
+    '''
+    Long-running dispatch service that serves a trained Q-table.
+
+    The server keeps the policy, the pool of open orders and the known couriers
+    in memory. Clients talk to it over a local TCP socket using newline
+    delimited JSON, one event per line:
+
+    * {"type": "order_created", "seq": 1, "order_id": "o1",
+       "origin": [x, y], "destination": [x, y], "patience": 10}
+        Adds the order to the pool. Reply: {"seq": 1, "type": "order_ack"}
+        Patience is counted in units of patience_tick seconds of wall-clock
+        time (1 second by default): the order above expires 10 seconds after
+        it was received unless it is delivered first.
+
+    * {"type": "courier_position", "seq": 2, "courier_id": "c1", "location": [x, y]}
+        Updates the courier location, assigns an order to it if it is idle
+        (assign_order_to_courier) and returns its next action
+        (epsilon_greedy with epsilon=0).
+        Reply: {"seq": 2, "type": "decision", "courier_id": "c1",
+                "order_id": "o1" or null, "action": "up"}
+
+    Malformed events (missing fields, locations outside the grid) get an
+    error reply {"seq": 3, "type": "error", "error": "..."} without affecting
+    the other events of the tick.
+
+    Events that arrive within the same tick are micro-batched: all orders of
+    the tick are added to the pool first, then the couriers are assigned, and
+    the greedy actions of the whole batch are computed in one vectorized call.
+    The chosen action is applied with take_action so that pick-ups, deliveries
+    and rejects update the pool exactly as in simulation.
+    '''
+    def __init__(self, q_table, m=5, tick_interval=0.002, seed=None, patience_tick=1.0):
+        self.q_table = q_table
+        self.m = m
+        self.tick_interval = tick_interval
+        self.patience_tick = patience_tick
+        self.rng = RandomStream(seed)
+        self.last_patience_update = time.perf_counter()
+
+        self.order_list = []
+        self.order_ids = {}  # Order -> external order id
+        self.couriers = {}  # external courier id -> Courier
+
+        self.queue = asyncio.Queue()
+        self.batch_sizes = []
+        self.compute_per_event = []  # batch compute time divided by batch size (seconds)
+        self.event_latencies = []  # time from enqueue to reply, per event (seconds)
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        logging.debug(f"Client connected: {peer}")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    writer.write(b'{"type": "error", "error": "invalid json"}\n')
+                    continue
+
+                future = asyncio.get_running_loop().create_future()
+                await self.queue.put((event, future, time.perf_counter()))
+                future.add_done_callback(lambda f, w=writer: self._write_reply(w, f.result()))
+                await writer.drain()
+        except ConnectionResetError:
+            pass
+        finally:
+            logging.debug(f"Client disconnected: {peer}")
+            writer.close()
+
+    @staticmethod
+    def _write_reply(writer, reply):
+        if not writer.is_closing():
+            writer.write((json.dumps(reply) + '\n').encode())
+
+    async def run_batcher(self):
+        '''
+        Collects the events of each tick and decides them as one batch.
+        '''
+        while True:
+            # Wait for the first event of the tick, then gather everything
+            # else that arrives before the tick ends
+            batch = [await self.queue.get()]
+            await asyncio.sleep(self.tick_interval)
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            start = time.perf_counter()
+            self.update_patience(start)
+            try:
+                replies = self.process_batch([event for event, _, _ in batch])
+            except Exception as e:
+                # Keep serving; fail only the events of this tick
+                logging.exception("Failed to process dispatch batch.")
+                replies = [{'seq': event.get('seq') if isinstance(event, dict) else None, 'type': 'error', 'error': str(e)}
+                           for event, _, _ in batch]
+            end = time.perf_counter()
+
+            self.batch_sizes.append(len(batch))
+            self.compute_per_event.append((end - start) / len(batch))
+
+            for (_, future, enqueued_at), reply in zip(batch, replies):
+                if not future.done():
+                    future.set_result(reply)
+                    self.event_latencies.append(end - enqueued_at)
+
+    def update_patience(self, now):
+        '''
+        Decrements the patience of open orders once per elapsed patience_tick.
+
+        The batcher only wakes up when events arrive, so after an idle period
+        several patience ticks are applied at once.
+        '''
+        due = int((now - self.last_patience_update) / self.patience_tick)
+        if due == 0:
+            return
+
+        self.last_patience_update += due * self.patience_tick
+        for _ in range(due):
+            if not self.order_list:
+                break
+            update_order_patience(self.order_list, on_timeout=self._expire_order)
+
+    def _expire_order(self, order):
+        '''
+        Forgets an order that timed out and releases the courier holding it.
+        '''
+        self.order_ids.pop(order, None)
+        for courier in self.couriers.values():
+            if courier.current_order is order:
+                courier.current_order = None
+                courier.is_busy = False
+
+    def _is_location(self, value):
+        return (
+            isinstance(value, list) and len(value) == 2
+            and all(isinstance(v, int) and not isinstance(v, bool) and 0 <= v < self.m for v in value)
+        )
+
+    def _validate_event(self, event):
+        '''
+        Returns an error message for a malformed event, or None if it is valid.
+        '''
+        if not isinstance(event, dict):
+            return "event must be a JSON object"
+
+        event_type = event.get('type')
+        if event_type == 'order_created':
+            for field in ('origin', 'destination'):
+                if not self._is_location(event.get(field)):
+                    return f"'{field}' must be [x, y] with 0 <= x, y < {self.m}"
+            patience = event.get('patience', 10)
+            if not isinstance(patience, int) or isinstance(patience, bool) or patience <= 0:
+                return "'patience' must be a positive integer"
+        elif event_type == 'courier_position':
+            if 'courier_id' not in event:
+                return "missing 'courier_id'"
+            try:
+                hash(event['courier_id'])
+            except TypeError:
+                return "'courier_id' must be a string or a number"
+            if not self._is_location(event.get('location')):
+                return f"'location' must be [x, y] with 0 <= x, y < {self.m}"
+        else:
+            return f"unknown event type: {event_type}"
+
+        return None
+
+    def process_batch(self, events):
+        '''
+        Applies one tick of events and returns one reply per event.
+
+        Parameters:
+        - events (list): Decoded JSON events, in arrival order.
+
+        Returns:
+        - replies (list): One reply dictionary per event.
+        '''
+        replies = [None] * len(events)
+        position_events = []
+
+        # 1. Register all orders of the tick before any assignment happens
+        for idx, event in enumerate(events):
+            error = self._validate_event(event)
+            if error is not None:
+                seq = event.get('seq') if isinstance(event, dict) else None
+                replies[idx] = {'seq': seq, 'type': 'error', 'error': error}
+                continue
+
+            if event['type'] == 'order_created':
+                order = Order(
+                    origin=tuple(event['origin']),
+                    destination=tuple(event['destination']),
+                    patience=event.get('patience', 10)
+                )
+                self.order_list.append(order)
+                self.order_ids[order] = event.get('order_id')
+                replies[idx] = {'seq': event.get('seq'), 'type': 'order_ack'}
+            else:
+                position_events.append(idx)
+
+        # 2. Update positions and assign orders to idle couriers
+        decided = []
+        for idx in position_events:
+            event = events[idx]
+            courier_id = event['courier_id']
+            location = tuple(event['location'])
+
+            courier = self.couriers.get(courier_id)
+            if courier is None:
+                courier = Courier(location)
+                self.couriers[courier_id] = courier
+            courier.location = location
+
+            assign_order_to_courier(self.order_list, courier, self.rng)
+            decided.append((idx, courier))
+
+        # 3. Decide the next action for every courier of the batch at once
+        states = [
+            (
+                courier.location,
+                courier.current_order.origin if courier.current_order else None,
+                courier.current_order.destination if courier.current_order else None
+            )
+            for _, courier in decided
+        ]
+        batch_actions = greedy_actions(states, self.q_table, self.rng)
+
+        for (idx, courier), action in zip(decided, batch_actions):
+            order = courier.current_order
+            order_id = self.order_ids.get(order) if order else None
+
+            take_action(courier, action, self.order_list, self.m)
+
+            # Forget orders that left the pool on delivery
+            if order is not None and action == 'deliver' and courier.current_order is None:
+                self.order_ids.pop(order, None)
+
+            replies[idx] = {
+                'seq': events[idx].get('seq'),
+                'type': 'decision',
+                'courier_id': events[idx]['courier_id'],
+                'order_id': order_id,
+                'action': action
+            }
+
+        return replies
+
+    def latency_report(self):
+        '''
+        Summarizes server-side latency.
+
+        The decision latency of an event is the time from when it is queued
+        until its reply is ready, so it includes the wait for the tick to end.
+        The compute time is the batch processing time divided by the batch size.
+
+        Returns:
+        - report: Dictionary with batch and per-event latency statistics (ms).
+        '''
+        if not self.event_latencies:
+            return {}
+
+        latencies_ms = np.array(self.event_latencies) * 1000
+        return {
+            'Batches': len(self.batch_sizes),
+            'Mean Batch Size': float(np.mean(self.batch_sizes)),
+            'p50 Decision Latency (ms)': float(np.percentile(latencies_ms, 50)),
+            'p99 Decision Latency (ms)': float(np.percentile(latencies_ms, 99)),
+            'Mean Amortized Compute per Event (ms)': float(np.mean(self.compute_per_event) * 1000)
+        }
+
+
+async def serve(q_table, m=5, host='127.0.0.1', port=8765, tick_interval=0.002, seed=None, patience_tick=1.0):
+    '''
+    Starts a DispatchServer and serves until cancelled.
+    '''
+    server = DispatchServer(q_table, m=m, tick_interval=tick_interval, seed=seed, patience_tick=patience_tick)
+    batcher = asyncio.create_task(server.run_batcher())
+    tcp_server = await asyncio.start_server(server.handle_client, host, port)
+
+    logging.getLogger('DispatchServer').info(f"Serving {len(q_table)} Q-table entries on {host}:{port} (m={m})")
+
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        batcher.cancel()
+        logging.getLogger('DispatchServer').info(f"Server-side latency: {server.latency_report()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a trained Q-table as an asyncio dispatch service.")
+    parser.add_argument('--q-table', required=True, help="Path to a Q-table saved with save_q_table.")
+    parser.add_argument('--m', type=int, default=5, help="Grid length the Q-table was trained on.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tick', type=float, default=0.002, help="Micro-batching tick in seconds.")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--patience-tick', type=float, default=1.0, help="Seconds per unit of order patience.")
+    args = parser.parse_args()
+
+    setup_logging(log_file='dispatch_server.log')
+    logging.getLogger().setLevel(logging.INFO)
+
+    try:
+        asyncio.run(serve(load_q_table(args.q_table), m=args.m, host=args.host, port=args.port,
+                          tick_interval=args.tick, seed=args.seed, patience_tick=args.patience_tick))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,138 @@
+import time
+import random
+import logging
+
+from core.action import take_action
+from core.compiled_env import ACTION_CODES, CompiledGrid, take_action_compiled
+from core.order import Order
+from utils.general_utils import plot_and_save_graphs
+from utils.order_utils import process_orders, update_order_patience
+
+
+def run_episodes(couriers, order_list, select_actions, update, max_episodes=1000, m=5, rng=None, compiled=False,
+                 random_start=False, assign_every_step=True, on_episode_start=None, max_steps=100,
+                 name='Training', grid_name=None):
+    '''
+    Runs the training episodes shared by all Q-learning trainers.
+
+    Every episode resets the couriers and starts from a fresh copy of the
+    template orders. At every step all couriers act, the environment is
+    stepped, order patience is updated and timed-out orders are penalized.
+    The trainers only differ in how actions are selected and how the
+    transitions are learned from, which they pass in as callbacks.
+
+    Parameters:
+    - couriers: A list of Courier instances.
+    - order_list: A list of Order objects used as a template; every episode
+      starts from a fresh copy of these orders.
+    - select_actions (callable): Called with the list of the couriers' states
+      at every step; returns one action per state.
+    - update (callable): Called with the list of (state, action, reward,
+      next_state) transitions of every step, one per courier.
+    - max_episodes (int): Number of training episodes.
+    - m (int/float): Parameter controlling reward magnitudes, proportional to grid size.
+    - rng (RandomStream): Stream for order tie-breaks and random starts. The
+      global random module is used if None.
+    - compiled (bool): Step the environment with the precomputed tables of
+      core.compiled_env instead of take_action.
+    - random_start (bool): Start every courier at a random cell instead of (0, 0).
+    - assign_every_step (bool): Let idle couriers take orders from the pool at
+      every step, including rejected ones. If False, orders are only assigned
+      at the start of the episode.
+    - on_episode_start (callable): Called without arguments before every episode.
+    - max_steps (int): Maximum number of steps per episode.
+    - name (str): Trainer name used in the throughput log.
+    - grid_name (str): Grid name of the saved plots; defaults to str(m).
+
+    Returns:
+    - episode_lengths (list), episode_rewards (list)
+    '''
+    grid = CompiledGrid(m) if compiled else None
+
+    episode_lengths = []
+    episode_rewards = []
+    total_transitions = 0
+    start_time = time.perf_counter()
+
+    for episode in range(1, max_episodes + 1):
+        total_reward = 0
+        episode_length = 0
+
+        # Reset couriers' states
+        for courier in couriers:
+            courier.is_busy = False
+            courier.current_order = None
+            if random_start:
+                courier.location = ((rng or random).choice(range(m)), (rng or random).choice(range(m)))
+            else:
+                courier.location = (0, 0)  # Reset to starting location
+
+        # Reset orders from the template; delivered and timed-out orders are
+        # removed from the episode's list
+        episode_orders = [Order(order.origin, order.destination, order.patience) for order in order_list]
+
+        if on_episode_start is not None:
+            on_episode_start()
+
+        if not assign_every_step:
+            # Assign orders at the start of the episode only
+            process_orders(episode_orders, couriers, rng)
+
+        # Loop over time steps in the episode
+        for step in range(1, max_steps + 1):
+            episode_length += 1
+
+            if assign_every_step:
+                # Idle couriers pick up orders from the shared pool, including rejected ones
+                process_orders(episode_orders, couriers, rng)
+
+            # Every courier acts in the same step
+            states = [
+                (
+                    courier.location,
+                    courier.current_order.origin if courier.current_order else None,
+                    courier.current_order.destination if courier.current_order else None
+                )
+                for courier in couriers
+            ]
+            batch_actions = select_actions(states)
+
+            transitions = []
+            for courier, state, action in zip(couriers, states, batch_actions):
+                if compiled:
+                    next_state, reward = take_action_compiled(courier, ACTION_CODES[action], episode_orders, grid)
+                else:
+                    next_state, reward = take_action(courier, action, episode_orders, m)
+
+                transitions.append((state, action, reward, next_state))
+                total_reward += reward
+
+            update(transitions)
+            total_transitions += len(transitions)
+
+            # Update order patience and apply penalties for timed-out orders
+            timed_out_count = update_order_patience(episode_orders)
+            if timed_out_count > 0:
+                penalty = timed_out_count * m
+                total_reward -= penalty
+                logging.debug(f"Episode {episode}, Step {step}: Applied penalty for {timed_out_count} timed-out order(s): -{penalty}")
+
+            # Check for terminal conditions (e.g., all orders delivered or timed out)
+            if len(episode_orders) == 0:
+                logging.debug(f"Episode {episode}: All orders have been processed by step {step}.")
+                break
+
+        # Save episode data for plotting
+        episode_lengths.append(episode_length)
+        episode_rewards.append(total_reward)
+
+        logging.debug(f"Episode {episode}: Total reward: {total_reward}\n")
+
+    elapsed = time.perf_counter() - start_time
+    logging.info(f"{name} with {len(couriers)} couriers: {total_transitions} transitions "
+                 f"in {elapsed:.2f}s ({total_transitions / elapsed:.0f} transitions/sec)")
+
+    # Plot and save the graphs after training
+    plot_and_save_graphs(episode_lengths, episode_rewards, grid_name or str(m), str(len(couriers)))
+
+    return episode_lengths, episode_rewards
@@ -0,0 +1,236 @@
+import numpy as np
+
+from constants import actions
+from core.compiled_env import ACTION_CODES
+from learning.episodes import run_episodes
+from learning.policy import epsilon_greedy
+
+
+class LinearQFunction:
+    '''
+    Q-function represented as a linear model over compact state features.
+
+    Q(state, action) = features(state) · weights[:, action]
+
+    The features do not grow with the grid, so memory stays constant and what
+    is learned in one part of the grid carries over to states that were never
+    visited:
+
+    * tile-coded courier location: num_tilings offset tilings of
+      tiles_per_dim x tiles_per_dim tiles over the normalized grid
+    * offsets from the courier to the order origin and destination,
+      normalized by the grid length, plus their signs (one-hot -, 0, +)
+    * whether the courier is at the origin / at the destination
+    * whether the courier has an order, and a bias
+
+    The state does not tell whether the order was already picked up, so the
+    features cannot either.
+
+    Behaves like a read-only Q-table, so it can be passed to epsilon_greedy
+    and simulate_couriers in place of a trained dictionary.
+    '''
+    def __init__(self, m, num_tilings=4, tiles_per_dim=4):
+        self.m = m
+        self.num_tilings = num_tilings
+        self.tiles_per_dim = tiles_per_dim
+
+        # Each tiling is shifted, so it needs one extra tile per dimension
+        self.tiles_per_tiling = (tiles_per_dim + 1) ** 2
+        self.num_tile_features = num_tilings * self.tiles_per_tiling
+        self.num_features = self.num_tile_features + 4 + 12 + 2 + 2 + 1
+
+        self.weights = np.zeros((self.num_features, len(actions)), dtype=np.float64)
+
+    def features_batch(self, states):
+        '''
+        Computes the feature matrix of a batch of states.
+
+        Parameters:
+        - states (list): (location, origin, destination) states.
+
+        Returns:
+        - features (np.ndarray): Array of shape (len(states), num_features).
+        '''
+        n = len(states)
+        m = self.m
+        features = np.zeros((n, self.num_features), dtype=np.float64)
+        rows = np.arange(n)
+
+        location = np.array([state[0] for state in states], dtype=np.float64).reshape(n, 2)
+        has_order = np.array([state[1] is not None for state in states])
+        origin = np.array([state[1] if state[1] is not None else state[0] for state in states], dtype=np.float64).reshape(n, 2)
+        destination = np.array([state[2] if state[2] is not None else state[0] for state in states], dtype=np.float64).reshape(n, 2)
+
+        # Tile-coded location
+        normalized = location / m
+        for tiling in range(self.num_tilings):
+            offset = tiling / (self.num_tilings * self.tiles_per_dim)
+            tile = np.floor((normalized + offset) * self.tiles_per_dim).astype(int)
+            index = tiling * self.tiles_per_tiling + tile[:, 0] * (self.tiles_per_dim + 1) + tile[:, 1]
+            features[rows, index] = 1.0
+
+        # Relative offsets to origin and destination (zero without an order)
+        column = self.num_tile_features
+        offsets = np.hstack([origin - location, destination - location])
+        features[:, column:column + 4] = offsets / m
+        column += 4
+
+        # Offset signs, one-hot over (-, 0, +); only meaningful with an order
+        signs = np.sign(offsets).astype(int) + 1
+        for k in range(4):
+            features[rows[has_order], column + 3 * k + signs[has_order, k]] = 1.0
+        column += 12
+
+        # At origin / at destination
+        features[:, column] = has_order & (offsets[:, 0] == 0) & (offsets[:, 1] == 0)
+        features[:, column + 1] = has_order & (offsets[:, 2] == 0) & (offsets[:, 3] == 0)
+        column += 2
+
+        # Has order (one-hot) and bias
+        features[rows, column + has_order.astype(int)] = 1.0
+        features[:, column + 2] = 1.0
+
+        return features
+
+    def features(self, state):
+        return self.features_batch([state])[0]
+
+    def q_values(self, state):
+        '''
+        Returns the Q-values of all actions of a state.
+        '''
+        return self.features(state) @ self.weights
+
+    def q_values_batch(self, states):
+        return self.features_batch(states) @ self.weights
+
+    def get(self, key, default=0):
+        state, action = key
+        return float(self.q_values(state)[ACTION_CODES[action]])
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __len__(self):
+        return self.weights.size
+
+    def update_batch(self, transitions, gamma, learning_rate):
+        '''
+        Applies one vectorized semi-gradient Q-learning step to a batch.
+
+        The step of each transition is normalized by the squared norm of its
+        features, so learning_rate has the same meaning as in the tabular
+        update regardless of how many features are active.
+
+        Parameters:
+        - transitions (list): (state, action, reward, next_state) tuples.
+        - gamma (float): Discount factor for future rewards.
+        - learning_rate (float): Step size of the update.
+
+        Returns:
+        - None
+        '''
+        states, batch_actions, rewards, next_states = zip(*transitions)
+        features = self.features_batch(states)
+        next_features = self.features_batch(next_states)
+        action_codes = np.array([ACTION_CODES[action] for action in batch_actions])
+
+        # Targets from the weights before the update
+        targets = np.asarray(rewards, dtype=np.float64) + gamma * (next_features @ self.weights).max(axis=1)
+        predictions = np.einsum('ij,ij->i', features, self.weights[:, action_codes].T)
+        td_errors = targets - predictions
+
+        steps = learning_rate * td_errors / (features ** 2).sum(axis=1)
+        gradient = np.zeros((len(actions), self.num_features))
+        np.add.at(gradient, action_codes, steps[:, None] * features)
+        self.weights += gradient.T
+
+    def resized(self, m):
+        '''
+        Returns a copy of the model for another grid length.
+
+        The features are normalized by the grid length, so a model trained on
+        a small grid can act on a larger one, where tabular training is not
+        feasible.
+
+        Parameters:
+        - m (int): Grid length of the new model.
+
+        Returns:
+        - model (LinearQFunction): Model sharing a copy of the learned weights.
+        '''
+        model = LinearQFunction(m, self.num_tilings, self.tiles_per_dim)
+        model.weights = self.weights.copy()
+        return model
+
+    def memory_usage(self):
+        return self.weights.nbytes
+
+    def memory_report(self):
+        return {
+            'Layout': 'linear',
+            'Memory (MiB)': self.memory_usage() / 1024 ** 2,
+            'Features': self.num_features,
+            'Weights': self.weights.size
+        }
+
+
+def linear_q_learning(couriers, order_list, model, gamma=0.9, epsilon=0.3, max_episodes=1000, m=5, learning_rate=0.3,
+                      batch_size=32, random_start=False, rng=None, compiled=False):
+    '''
+    Trains a LinearQFunction with batched, vectorized Q-learning updates.
+
+    Episodes are run by the same runner as multi_agent_q_learning (one or
+    more couriers sharing the order pool), but transitions are collected and
+    the model is updated once every batch_size transitions.
+
+    Exploration and step size default higher than in the tabular trainers.
+    Bumping into a wall (-0.5 per step) is cheaper than moving with an order
+    (-1), and with epsilon=0.1 and learning_rate=0.1 the model often settles
+    on bumping into walls before it has seen enough deliveries to value them
+    (see misc/evaluate_linear_q.py).
+
+    Parameters:
+    - couriers: A list of Courier instances.
+    - order_list: A list of Order objects used as a template; every episode
+      starts from a fresh copy of these orders.
+    - model (LinearQFunction): The model to train.
+    - gamma (float): Discount factor for future rewards.
+    - epsilon (float): Exploration rate for the epsilon-greedy policy.
+    - max_episodes (int): Number of training episodes.
+    - m (int/float): Parameter controlling reward magnitudes, proportional to grid size.
+    - learning_rate (float): Step size of the update.
+    - batch_size (int): Number of transitions per update.
+    - random_start (bool): Start every courier at a random cell instead of
+      (0, 0). Needed on large grids, where couriers starting in a corner
+      never reach most of the states before the orders time out.
+    - rng (RandomStream): Stream for exploration and tie-breaks. The global
+      random module is used if None.
+    - compiled (bool): Step the environment with the precomputed tables of
+      core.compiled_env instead of take_action.
+
+    Returns:
+    - model: The trained model.
+    '''
+    assert 0 <= gamma <= 1, "Discount factor (gamma) must be between 0 and 1"
+    assert 0 <= epsilon <= 1, "Exploration rate (epsilon) must be between 0 and 1"
+    assert len(couriers) > 0, "At least one courier is required"
+
+    transitions = []
+
+    def update(step_transitions):
+        # Update the model once a full batch has been collected
+        transitions.extend(step_transitions)
+        if len(transitions) >= batch_size:
+            model.update_batch(transitions, gamma, learning_rate)
+            transitions.clear()
+
+    run_episodes(couriers, order_list,
+                 lambda states: [epsilon_greedy(state, model, epsilon, rng) for state in states],
+                 update, max_episodes, m, rng, compiled, random_start=random_start,
+                 name='Linear Q-learning', grid_name=f"{m}_linear")
+
+    if transitions:
+        model.update_batch(transitions, gamma, learning_rate)
+
+    return model
@@ -1,8 +1,12 @@
 import random
+
+import numpy as np
+
 from constants import actions
+from utils.rng import RandomStream
 
 # Select an action based on epsilon-greedy policy
-def epsilon_greedy(state, q_table, epsilon):
+def epsilon_greedy(state, q_table, epsilon, rng=None):
     """
     Selects an action based on the epsilon-greedy policy.
 
@@ -15,6 +19,8 @@ def epsilon_greedy(state, q_table, epsilon):
     - state: The current state of the agent.
     - q_table: A dictionary mapping (state, action) pairs to Q-values.
     - epsilon (float): The exploration rate (0 ≤ epsilon ≤ 1).
+    - rng (RandomStream): Stream used for the exploration coin and tie-breaks.
+      The global random module is used if None.
 
     Returns:
     - An action selected according to the epsilon-greedy policy.
@@ -22,16 +28,97 @@ def epsilon_greedy(state, q_table, epsilon):
     assert 0 <= epsilon <= 1, "Epsilon must be between 0 and 1"
     assert len(actions) > 0, "The actions list must not be empty"
 
-    if random.random() < epsilon: # Exploration
-        return random.choice(actions)
+    if rng is None:
+        rng = random
+
+    if epsilon > 0 and rng.random() < epsilon: # Exploration
+        return rng.choice(actions)
     else: # Exploitation
         # Get Q-values for all actions in the current state
-        q_values = [q_table.get((state, action), 0) for action in actions]
+        if hasattr(q_table, 'q_values'):
+            # Array-backed Q-tables return the whole row in one lookup
+            q_values = q_table.q_values(state).tolist()
+        else:
+            q_values = [q_table.get((state, action), 0) for action in actions]
         max_q_value = max(q_values)
 
         # Find all actions that have the max Q-value
         max_actions = [action for action, q in zip(actions, q_values) if q == max_q_value]
         # Select randomly among them to break ties
-        best_action = random.choice(max_actions)
+        best_action = max_actions[0] if len(max_actions) == 1 else rng.choice(max_actions)
+
+        return best_action
+
+def greedy_actions(states, q_table, rng=None):
+    """
+    Selects the greedy action for a batch of states at once.
+
+    Equivalent to calling epsilon_greedy(state, q_table, epsilon=0) for every
+    state; see epsilon_greedy_actions.
+
+    Parameters:
+    - states (list): The states to select actions for.
+    - q_table: A dictionary mapping (state, action) pairs to Q-values.
+    - rng (numpy.random.Generator or RandomStream): Generator used to break
+      ties. A fresh default generator is used if None.
+
+    Returns:
+    - A list with one action per state.
+    """
+    return epsilon_greedy_actions(states, q_table, 0, rng)
+
+def epsilon_greedy_actions(states, q_table, epsilon, rng=None):
+    """
+    Selects epsilon-greedy actions for a batch of states at once.
+
+    Equivalent to calling epsilon_greedy for every state, but the Q-values of
+    the batch are gathered into a single (len(states), len(actions)) array
+    (with one q_values_batch call on tables that provide it) and the
+    exploration coins, random actions and tie-breaks are drawn together, so
+    the cost per state falls as the batch grows.
+
+    Parameters:
+    - states (list): The states to select actions for.
+    - q_table: A dictionary mapping (state, action) pairs to Q-values.
+    - epsilon (float): The exploration rate (0 ≤ epsilon ≤ 1).
+    - rng (numpy.random.Generator or RandomStream): Generator used for the
+      exploration coins and tie-breaks. A fresh default generator is used if None.
+
+    Returns:
+    - A list with one action per state.
+    """
+    assert 0 <= epsilon <= 1, "Epsilon must be between 0 and 1"
+
+    if not states:
+        return []
+
+    if rng is None:
+        rng = np.random.default_rng()
+    elif isinstance(rng, RandomStream):
+        rng = rng.generator
+
+    if hasattr(q_table, 'q_values_batch'):
+        q_values = q_table.q_values_batch(states)
+    else:
+        # Look up every distinct state once
+        unique_states = list(dict.fromkeys(states))
+        row_of = {state: row for row, state in enumerate(unique_states)}
+        if hasattr(q_table, 'q_values'):
+            rows = [q_table.q_values(state) for state in unique_states]
+        else:
+            rows = [[q_table.get((state, action), 0) for action in actions] for state in unique_states]
+        q_values = np.array(rows, dtype=np.float64)[[row_of[state] for state in states]]
+
+    # One draw per state and action for the tie-breaks, plus the exploration
+    # coin and the random action
+    draws = rng.random((len(states), len(actions) + 2))
+
+    # Break ties uniformly by giving every max-valued action a random score
+    is_max = q_values == q_values.max(axis=1, keepdims=True)
+    best = np.where(is_max, draws[:, 2:], -1.0).argmax(axis=1)
+
+    if epsilon > 0:
+        explore = draws[:, 0] < epsilon
+        best = np.where(explore, (draws[:, 1] * len(actions)).astype(int), best)
 
-        return best_action
\ No newline at end of file
+    return [actions[i] for i in best.tolist()]
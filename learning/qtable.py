@@ -0,0 +1,332 @@
+import logging
+
+import numpy as np
+
+from constants import actions
+
+
+# Index of each action in the value arrays
+action_index = {action: i for i, action in enumerate(actions)}
+
+# Smallest unsigned integer type with one bit per action, for SparseQTable's written bitmask
+written_bits_dtype = np.min_scalar_type((1 << len(actions)) - 1)
+
+
+def num_states(m):
+    '''
+    Number of (location, origin, destination) states on an m x m grid. Origin
+    and destination may also be None, hence the m² + 1 factors.
+    '''
+    return (m ** 2) * (m ** 2 + 1) ** 2
+
+
+def encode_state(state, m):
+    '''
+    Packs a (location, origin, destination) state into a single integer code.
+
+    Parameters:
+    - state (tuple): (location, origin, destination); origin and destination may be None.
+    - m (int): Grid length.
+
+    Returns:
+    - code (int): Integer in [0, num_states(m)).
+    '''
+    location, origin, destination = state
+    cells = m ** 2 + 1
+    location_idx = location[0] * m + location[1]
+    origin_idx = 0 if origin is None else 1 + origin[0] * m + origin[1]
+    destination_idx = 0 if destination is None else 1 + destination[0] * m + destination[1]
+    return (location_idx * cells + origin_idx) * cells + destination_idx
+
+
+def decode_state(code, m):
+    '''
+    Inverse of encode_state.
+    '''
+    cells = m ** 2 + 1
+    code, destination_idx = divmod(code, cells)
+    location_idx, origin_idx = divmod(code, cells)
+
+    def cell(idx):
+        return None if idx == 0 else divmod(idx - 1, m)
+
+    return divmod(location_idx, m), cell(origin_idx), cell(destination_idx)
+
+
+class DenseQTable:
+    '''
+    Q-table stored as a dense (num_states, num_actions) float32 array.
+
+    Behaves like the dictionary Q-table used throughout the code: it is
+    indexed by (state, action) pairs and get() returns the default for pairs
+    that were never written. Suitable for small grids only, since memory grows
+    with m⁶.
+    '''
+    def __init__(self, m):
+        self.m = m
+        self.values = np.zeros((num_states(m), len(actions)), dtype=np.float32)
+        self.written = np.zeros((num_states(m), len(actions)), dtype=bool)
+        self.num_entries = 0
+
+    def get(self, key, default=None):
+        state, action = key
+        code = encode_state(state, self.m)
+        a = action_index[action]
+        if not self.written[code, a]:
+            return default
+        return float(self.values[code, a])
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        state, action = key
+        code = encode_state(state, self.m)
+        a = action_index[action]
+        if not self.written[code, a]:
+            self.written[code, a] = True
+            self.num_entries += 1
+        self.values[code, a] = value
+
+    def __contains__(self, key):
+        state, action = key
+        return bool(self.written[encode_state(state, self.m), action_index[action]])
+
+    def __len__(self):
+        return self.num_entries
+
+    def items(self):
+        for code, a in zip(*np.nonzero(self.written)):
+            yield (decode_state(int(code), self.m), actions[a]), float(self.values[code, a])
+
+    def q_values(self, state):
+        '''
+        Returns a copy of the Q-values of all actions of a state (0 for unwritten pairs).
+        '''
+        return self.values[encode_state(state, self.m)].copy()
+
+    def q_values_batch(self, states):
+        '''
+        Returns the Q-values of a batch of states as a (len(states), num_actions) array.
+        '''
+        m = self.m
+        return self.values[[encode_state(state, m) for state in states]]
+
+    def set_batch(self, states, action_indices, values):
+        '''
+        Writes one value per (state, action index) pair. Pairs must be distinct.
+        '''
+        m = self.m
+        codes = np.array([encode_state(state, m) for state in states], dtype=np.int64)
+        action_indices = np.asarray(action_indices)
+        self.num_entries += int(np.count_nonzero(~self.written[codes, action_indices]))
+        self.written[codes, action_indices] = True
+        self.values[codes, action_indices] = values
+
+    def visited_states(self):
+        return int(self.written.any(axis=1).sum())
+
+    def memory_usage(self):
+        return self.values.nbytes + self.written.nbytes
+
+    def memory_report(self):
+        return _memory_report(self, 'dense')
+
+
+class SparseQTable:
+    '''
+    Q-table for large grids stored in an open-addressing hash table.
+
+    Keys are states packed into int64 codes (encode_state). Each slot holds
+    the float32 values of all actions of its state in a parallel array and a
+    bitmask of the written actions (one byte for up to 8 actions), so a state
+    costs 8 + 4 * num_actions + 1 bytes instead of one dictionary entry per
+    (state, action) pair. Collisions are resolved by linear probing and
+    the table doubles once it is half full.
+
+    Behaves like the dictionary Q-table used throughout the code.
+    '''
+    EMPTY = -1
+
+    def __init__(self, m, initial_capacity=1024):
+        assert num_states(m) < 2 ** 63, "State codes must fit in int64"
+
+        capacity = 1
+        while capacity < initial_capacity:
+            capacity *= 2
+
+        self.m = m
+        self.num_states_used = 0
+        self.num_entries = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.keys = np.full(capacity, self.EMPTY, dtype=np.int64)
+        self.values = np.zeros((capacity, len(actions)), dtype=np.float32)
+        self.written = np.zeros(capacity, dtype=written_bits_dtype)  # bit a set once action a is written
+
+    def _hash(self, code):
+        # Fibonacci hashing spreads consecutive codes over the table
+        return ((code * 0x9E3779B97F4A7C15) >> 17) & self.mask
+
+    def _find(self, code):
+        '''
+        Returns the slot holding code, or the empty slot where it would go.
+        '''
+        keys = self.keys
+        slot = self._hash(code)
+        while True:
+            key = keys[slot]
+            if key == code or key == self.EMPTY:
+                return slot
+            slot = (slot + 1) & self.mask
+
+    def _grow(self):
+        old_keys, old_values, old_written = self.keys, self.values, self.written
+        self._allocate(self.capacity * 2)
+
+        for old_slot in np.flatnonzero(old_keys != self.EMPTY):
+            code = int(old_keys[old_slot])
+            slot = self._find(code)
+            self.keys[slot] = code
+            self.values[slot] = old_values[old_slot]
+            self.written[slot] = old_written[old_slot]
+
+        logging.debug(f"SparseQTable grown to {self.capacity} slots")
+
+    def get(self, key, default=None):
+        state, action = key
+        slot = self._find(encode_state(state, self.m))
+        a = action_index[action]
+        if self.keys[slot] == self.EMPTY or not (self.written[slot] >> a) & 1:
+            return default
+        return float(self.values[slot, a])
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        state, action = key
+        code = encode_state(state, self.m)
+        slot = self._find(code)
+
+        if self.keys[slot] == self.EMPTY:
+            if 2 * (self.num_states_used + 1) > self.capacity:
+                self._grow()
+                slot = self._find(code)
+            self.keys[slot] = code
+            self.num_states_used += 1
+
+        bit = 1 << action_index[action]
+        if not self.written[slot] & bit:
+            self.written[slot] |= bit
+            self.num_entries += 1
+        self.values[slot, action_index[action]] = value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return self.num_entries
+
+    def items(self):
+        for slot in np.flatnonzero(self.keys != self.EMPTY):
+            state = decode_state(int(self.keys[slot]), self.m)
+            for a, action in enumerate(actions):
+                if (self.written[slot] >> a) & 1:
+                    yield (state, action), float(self.values[slot, a])
+
+    def q_values(self, state):
+        '''
+        Returns a copy of the Q-values of all actions of a state (0 for unwritten pairs).
+
+        The row is copied because the value array is reallocated when the table grows.
+        '''
+        slot = self._find(encode_state(state, self.m))
+        if self.keys[slot] == self.EMPTY:
+            return np.zeros(len(actions), dtype=np.float32)
+        return self.values[slot].copy()
+
+    def q_values_batch(self, states):
+        '''
+        Returns the Q-values of a batch of states as a (len(states), num_actions) array.
+        '''
+        slots = np.array([self._find(encode_state(state, self.m)) for state in states], dtype=np.int64)
+        values = self.values[slots]
+        values[self.keys[slots] == self.EMPTY] = 0
+        return values
+
+    def set_batch(self, states, action_indices, values):
+        '''
+        Writes one value per (state, action index) pair. Pairs must be distinct.
+        '''
+        # Grow up front so that the slots found below stay valid
+        while 2 * (self.num_states_used + len(states)) > self.capacity:
+            self._grow()
+
+        slots = []
+        for state in states:
+            code = encode_state(state, self.m)
+            slot = self._find(code)
+            if self.keys[slot] == self.EMPTY:
+                self.keys[slot] = code
+                self.num_states_used += 1
+            slots.append(slot)
+
+        slots = np.array(slots, dtype=np.int64)
+        bits = np.left_shift(1, np.asarray(action_indices)).astype(written_bits_dtype)
+        self.num_entries += int(np.count_nonzero((self.written[slots] & bits) == 0))
+        np.bitwise_or.at(self.written, slots, bits)
+        self.values[slots, action_indices] = values
+
+    def visited_states(self):
+        return self.num_states_used
+
+    def memory_usage(self):
+        return self.keys.nbytes + self.values.nbytes + self.written.nbytes
+
+    def memory_report(self):
+        return _memory_report(self, 'sparse')
+
+
+def _memory_report(q_table, layout):
+    memory = q_table.memory_usage()
+    return {
+        'Layout': layout,
+        'Memory (MiB)': memory / 1024 ** 2,
+        'Entries': len(q_table),
+        'Bytes/Entry': memory / len(q_table) if len(q_table) else None,
+        'Visited States': q_table.visited_states(),
+        'State Coverage': q_table.visited_states() / num_states(q_table.m)
+    }
+
+
+def make_q_table(m, dense_max_bytes=64 * 1024 ** 2):
+    '''
+    Creates an empty Q-table, choosing the layout from the grid size.
+
+    The dense layout is used while its arrays fit in dense_max_bytes, the
+    sparse hash layout otherwise (e.g. a dense 64x64 table would need about
+    5.5 * 10^11 entries).
+
+    Parameters:
+    - m (int): Grid length.
+    - dense_max_bytes (int): Largest dense table allowed, in bytes.
+
+    Returns:
+    - q_table: DenseQTable or SparseQTable.
+    '''
+    dense_bytes = num_states(m) * len(actions) * (np.dtype(np.float32).itemsize + 1)
+    if dense_bytes <= dense_max_bytes:
+        return DenseQTable(m)
+
+    logging.info(f"Dense Q-table for {m}x{m} would need {dense_bytes / 1024 ** 2:.0f} MiB; using sparse layout")
+    return SparseQTable(m)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from constants import actions
+
+
+class EligibilityTraces:
+    '''
+    Sparse eligibility traces for tabular Q(λ).
+
+    Only (state, action) pairs with a non-negligible trace are stored: their
+    keys in a list and their trace values in a parallel numpy array, with a
+    dictionary from key to slot. Decaying is one vectorized multiplication,
+    and pairs whose trace falls below the threshold are dropped, so updates
+    touch only the pairs that are actually active.
+    '''
+    def __init__(self, threshold=1e-3, initial_capacity=256):
+        self.threshold = threshold
+        self.keys = []
+        self.slots = {}
+        self.values = np.zeros(initial_capacity, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def visit(self, key):
+        '''
+        Sets the trace of a visited (state, action) pair to 1 and clears the
+        traces of the other actions of the same state (replacing traces).
+        '''
+        state, action = key
+        for other in actions:
+            if other != action:
+                other_slot = self.slots.get((state, other))
+                if other_slot is not None:
+                    # Dropped at the next decay, since 0 is below the threshold
+                    self.values[other_slot] = 0.0
+
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.keys)
+            if slot == len(self.values):
+                self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+            self.keys.append(key)
+            self.slots[key] = slot
+        self.values[slot] = 1.0
+
+    def active(self):
+        '''
+        Returns the active keys and their trace values.
+        '''
+        return self.keys, self.values[:len(self.keys)]
+
+    def decay(self, factor):
+        '''
+        Multiplies all traces by factor and drops the ones below the threshold.
+        '''
+        n = len(self.keys)
+        values = self.values[:n]
+        values *= factor
+
+        keep = values >= self.threshold
+        if not keep.all():
+            kept = np.flatnonzero(keep)
+            self.keys = [self.keys[i] for i in kept]
+            self.slots = {key: slot for slot, key in enumerate(self.keys)}
+            self.values[:len(kept)] = values[kept]
+
+    def reset(self):
+        self.keys = []
+        self.slots = {}
@@ -4,14 +4,20 @@ import random
 from constants import simulation_parameters, num_orders
 from core.courier import Courier
 from utils.order_utils import generate_orders
-from learning.qlearning import q_learning
+from learning.qlearning import q_learning, multi_agent_q_learning
+from learning.qtable import make_q_table
 from utils.simulation_utils import simulate_couriers
+from utils.general_utils import save_q_table
+from utils.rng import make_streams
 
 import logging
 from logger_config import setup_logging
 
-# Set random seed for reproducibility
-random.seed(42)
+# Set random seed for reproducibility. Every configuration gets its own
+# independent stream, so results do not change when configurations run in
+# separate processes.
+SEED = 42
+random.seed(SEED)
 
 
 def main_simulation():
@@ -33,10 +39,11 @@ def main_simulation():
     logger.info("Starting the simulation.")
 
 
-    for grid_size_total, num_couriers, episode_number in simulation_parameters:
-        # TODO: Remove after validating single courier simulation
-        if num_couriers > 1: 
-            break
+    config_streams = make_streams(SEED, len(simulation_parameters))
+
+    for config_stream, (grid_size_total, num_couriers, episode_number) in zip(config_streams, simulation_parameters):
+        # One stream for training and one per simulation run
+        training_rng, *simulation_rngs = config_stream.spawn(3)
 
         grid_length = int(np.sqrt(grid_size_total))
         
@@ -47,26 +54,50 @@ def main_simulation():
 
         logger.info(f"\n=== Simulation for Grid Size: {grid_size_total} (Grid Length: {m}x{m}), Number of Couriers: {num_couriers} ===")
 
-        # Initialize Q-table
-        q_table = {}
-
-        # Initialize one courier for training
-        training_courier = Courier((0, 0))  # Starting at (0,0)
+        # Initialize Q-table; dense for small grids, sparse hash for large ones
+        q_table = make_q_table(m)
 
         # Generate orders for training
-        training_order_list = generate_orders(num_orders, m, patience=10)
-
-        # Train Q-learning for the current grid size
-        logger.info(f"Training Q-learning for grid size {grid_size_total} with 1 courier...")
-        trained_q_table = q_learning(
-            training_courier,
-            training_order_list,
-            q_table,
-            gamma=0.9,
-            epsilon=0.1,
-            max_episodes=episode_number,
-            m=m,
-        )
+        training_order_list = generate_orders(num_orders, m, patience=10, rng=training_rng)
+
+        if num_couriers == 1:
+            # Initialize one courier for training
+            training_courier = Courier((0, 0))  # Starting at (0,0)
+
+            # Train Q-learning for the current grid size
+            logger.info(f"Training Q-learning for grid size {grid_size_total} with 1 courier...")
+            trained_q_table = q_learning(
+                training_courier,
+                training_order_list,
+                q_table,
+                gamma=0.9,
+                epsilon=0.1,
+                max_episodes=episode_number,
+                m=m,
+                rng=training_rng,
+                compiled=True,
+            )
+        else:
+            # All couriers act in the same episodes and share the Q-table
+            training_couriers = [Courier((0, 0)) for _ in range(num_couriers)]
+
+            logger.info(f"Training multi-agent Q-learning for grid size {grid_size_total} with {num_couriers} couriers...")
+            trained_q_table = multi_agent_q_learning(
+                training_couriers,
+                training_order_list,
+                q_table,
+                gamma=0.9,
+                epsilon=0.1,
+                max_episodes=episode_number,
+                m=m,
+                rng=training_rng,
+                compiled=True,
+            )
+
+        logger.info(f"Q-table memory: {trained_q_table.memory_report()}")
+
+        # Persist the policy so that it can be served by dispatch.server
+        save_q_table(trained_q_table, f"q_tables/q_table_{m}x{m}_{num_couriers}.pkl")
 
         # Now, run simulations with the trained Q-table
         for simulation_run in range(1, 3):  # Run two simulations: one for 1 courier, one for 2 couriers
@@ -74,7 +105,7 @@ def main_simulation():
             couriers = [Courier((0, 0)) for _ in range(num_couriers)]  # All start at (0,0)
 
             # Generate a fresh set of orders for the simulation
-            simulation_order_list = generate_orders(num_orders, m, patience=10)
+            simulation_order_list = generate_orders(num_orders, m, patience=10, rng=simulation_rngs[simulation_run - 1])
 
             logger.info(f"\nRunning simulation {simulation_run} with {num_couriers} courier(s) on grid size {grid_size_total}...")
             summary = simulate_couriers(
@@ -83,7 +114,9 @@ def main_simulation():
                 trained_q_table,
                 grid_size=m,
                 m=m,
-                max_steps=100
+                max_steps=100,
+                rng=simulation_rngs[simulation_run - 1],
+                compiled=True
             )
 
             logger.info(f"Simulation {simulation_run} Result: {summary}")
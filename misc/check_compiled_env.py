@@ -0,0 +1,107 @@
+import copy
+import random
+import timeit
+
+from constants import actions
+from core.action import take_action
+from core.compiled_env import ACTION_CODES, CompiledGrid, take_action_compiled
+from core.courier import Courier
+from core.order import Order
+
+'''
+The compiled environment replaces take_action with precomputed lookup tables.
+This script's purpose is to verify that both produce the same next state, reward
+and side effects on random courier/order states, and to compare their speed.
+'''
+
+def random_setup(m):
+    """
+    Creates a courier with a random location and a random order in a random phase.
+
+    Returns:
+    - courier (Courier), order_list (list)
+    """
+    cells = [(x, y) for x in range(m) for y in range(m)]
+    courier = Courier(random.choice(cells))
+    origin, destination = random.sample(cells, 2)
+    # Put the courier on the origin/destination often enough to hit those branches
+    courier.location = random.choice([courier.location, origin, destination])
+
+    order = Order(origin, destination)
+    order_list = [Order(*random.sample(cells, 2)) for _ in range(3)] + [order]
+
+    if random.random() < 0.8:
+        order.status = random.choice(['assigned', 'in_transit'])
+        order.assigned = random.random() < 0.5
+        courier.current_order = order
+        courier.is_busy = random.random() < 0.5
+
+    return courier, order_list
+
+
+def snapshot(courier, order_list, next_state, reward):
+    order = courier.current_order
+    return (
+        next_state,
+        reward,
+        courier.location,
+        courier.is_busy,
+        order.status if order else None,
+        order.assigned if order else None,
+        [(o.origin, o.destination, o.status, o.assigned) for o in order_list]
+    )
+
+
+def differential_check(m, trials=20000):
+    """
+    Runs take_action and take_action_compiled on identical copies of random states.
+
+    Returns:
+    - mismatches (int): Number of trials where the results differ.
+    """
+    grid = CompiledGrid(m)
+    mismatches = 0
+
+    for _ in range(trials):
+        courier, order_list = random_setup(m)
+        action = random.choice(actions)
+
+        courier_copy, order_list_copy = copy.deepcopy((courier, order_list))
+
+        expected = snapshot(courier, order_list, *take_action(courier, action, order_list, m))
+        actual = snapshot(courier_copy, order_list_copy,
+                          *take_action_compiled(courier_copy, ACTION_CODES[action], order_list_copy, grid))
+
+        if expected != actual:
+            mismatches += 1
+            print(f"Mismatch for action '{action}':\n  take_action:          {expected}\n  take_action_compiled: {actual}")
+
+    return mismatches
+
+
+def benchmark(m, number=200000):
+    grid = CompiledGrid(m)
+    courier = Courier((0, 0))
+    order_list = []
+    moves = ['up', 'right', 'down', 'left']
+    codes = [ACTION_CODES[a] for a in moves]
+
+    original = timeit.timeit(lambda: take_action(courier, moves[random.randrange(4)], order_list, m), number=number)
+    compiled = timeit.timeit(lambda: take_action_compiled(courier, codes[random.randrange(4)], order_list, grid), number=number)
+    step = timeit.timeit(lambda: grid.step(0, -1, -1, 0, codes[random.randrange(4)]), number=number)
+
+    print(f"take_action: {original / number * 1e6:.2f} us, take_action_compiled: {compiled / number * 1e6:.2f} us, "
+          f"CompiledGrid.step: {step / number * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    random.seed(0)
+    for grid_length in [3, 5, 8]:
+        mismatches = differential_check(grid_length)
+        print(f"Grid Size: {grid_length}x{grid_length}")
+        print("Compiled environment matches take_action:", mismatches == 0)
+        benchmark(grid_length)
+        print("-" * 50)
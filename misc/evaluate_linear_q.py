@@ -0,0 +1,99 @@
+import argparse
+
+from core.action import take_action
+from core.courier import Courier
+from core.order import Order
+from learning.linear_q import LinearQFunction, linear_q_learning
+from learning.policy import epsilon_greedy
+from utils.order_utils import generate_orders
+from utils.rng import RandomStream
+
+'''
+LinearQFunction is meant to generalize: a model trained on a small grid should
+deliver orders on grids it was never trained on. This script's purpose is to
+measure that with a fixed protocol, so that results can be reproduced.
+
+Training (one run per seed):
+- train_m x train_m grid, 2 couriers starting at random cells (random_start)
+- 10 orders from generate_orders with patience 6 * train_m, drawn from the seed
+- linear_q_learning with the compiled environment for the given episodes,
+  epsilon, learning rate and gamma; exploration uses RandomStream(seed)
+
+Evaluation (same for every seed):
+- for each grid length, 200 single-order trials drawn from RandomStream(12345):
+  courier at a random cell holding an order with random origin != destination
+- the model acts greedily (epsilon=0) for at most 6 * m steps
+- a trial succeeds if the order is delivered
+'''
+
+def evaluate(model, m, trials=200, seed=12345):
+    """
+    Counts the single-order trials the model completes on an m x m grid.
+
+    Parameters:
+    - model: LinearQFunction (or any Q-table) to act with.
+    - m (int): Grid length.
+    - trials (int): Number of trials.
+    - seed (int): Seed of the trial layout and of the greedy tie-breaks.
+
+    Returns:
+    - delivered (int): Number of delivered orders.
+    """
+    rng = RandomStream(seed)
+    delivered = 0
+
+    for _ in range(trials):
+        origin = (rng.integer(m), rng.integer(m))
+        destination = origin
+        while destination == origin:
+            destination = (rng.integer(m), rng.integer(m))
+
+        courier = Courier((rng.integer(m), rng.integer(m)))
+        order = Order(origin, destination)
+        order.status = 'assigned'
+        courier.current_order = order
+        order_list = [order]
+
+        for _ in range(6 * m):
+            state = (courier.location, order.origin, order.destination)
+            take_action(courier, epsilon_greedy(state, model, 0, rng), order_list, m)
+            if courier.current_order is None:
+                break
+
+        # Rejected orders go back to 'pending'; only deliveries empty the list
+        if not order_list:
+            delivered += 1
+
+    return delivered
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    parser = argparse.ArgumentParser(description="Evaluate how LinearQFunction generalizes across grid sizes.")
+    parser.add_argument('--train-m', type=int, default=8)
+    parser.add_argument('--episodes', type=int, default=2000)
+    parser.add_argument('--epsilon', type=float, default=0.3)
+    parser.add_argument('--learning-rate', type=float, default=0.3)
+    parser.add_argument('--gamma', type=float, default=0.9)
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2, 3, 4])
+    parser.add_argument('--eval-m', type=int, nargs='+', default=[8, 16, 32, 64])
+    args = parser.parse_args()
+
+    trials = 200
+    print("Untrained model: " + ", ".join(
+        f"{m}x{m}: {evaluate(LinearQFunction(m), m, trials)}/{trials}" for m in args.eval_m))
+
+    for seed in args.seeds:
+        stream = RandomStream(seed)
+        orders = generate_orders(10, args.train_m, patience=6 * args.train_m, rng=stream)
+        couriers = [Courier((0, 0)) for _ in range(2)]
+
+        model = LinearQFunction(args.train_m)
+        linear_q_learning(couriers, orders, model, gamma=args.gamma, epsilon=args.epsilon,
+                          max_episodes=args.episodes, m=args.train_m, learning_rate=args.learning_rate,
+                          random_start=True, rng=stream, compiled=True)
+
+        results = [f"{m}x{m}: {evaluate(model.resized(m), m, trials)}/{trials}" for m in args.eval_m]
+        print(f"Seed {seed}, {args.episodes} episodes on {args.train_m}x{args.train_m}: " + ", ".join(results))
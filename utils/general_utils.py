@@ -1,5 +1,6 @@
 import os
-import logging 
+import pickle
+import logging
 
 import matplotlib.pyplot as plt
 
@@ -9,6 +10,41 @@ def manhattan_distance(a, b):
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
 
+def save_q_table(q_table, path):
+    '''
+    Saves a trained Q-table to disk so that it can be served later.
+
+    Parameters:
+    - q_table: A dictionary mapping (state, action) pairs to Q-values.
+    - path (str): Destination file path.
+
+    Returns:
+    - None
+    '''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, 'wb') as f:
+        pickle.dump(q_table, f)
+
+    logging.getLogger('save_q_table').info(f"Saved Q-table with {len(q_table)} entries to {path}")
+
+
+def load_q_table(path):
+    '''
+    Loads a Q-table previously written by save_q_table.
+
+    Parameters:
+    - path (str): Path of the pickled Q-table.
+
+    Returns:
+    - q_table: A dictionary mapping (state, action) pairs to Q-values.
+    '''
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
 def plot_and_save_graphs(episode_lengths, episode_rewards, grid_name, number_of_couriers):
     '''
     Plots and saves two graphs:
@@ -6,36 +6,47 @@ from core.order import Order
 from utils.general_utils import manhattan_distance
 
 
-def assign_order_to_courier(order_list, courier):
+def assign_order_to_courier(order_list, courier, rng=None):
     """
     Assigns the nearest unassigned order to a courier if available.
 
     Parameters:
     - order_list (list): List of Order objects.
     - courier (Courier): The courier to assign an order to.
+    - rng (RandomStream): Stream used to break ties between equally near
+      orders. The global random module is used if None.
 
     Returns:
     - None
     """
     if not courier.is_busy:
-        # Find the nearest unassigned order
-        unassigned_orders = [order for order in order_list if not order.status == 'assigned']
-        if unassigned_orders:
-            # Shuffle to randomize order among identical sorting keys
-            random.shuffle(unassigned_orders)
-            
-            # Define a sort key that prioritizes:
-            # 1. Distance from courier to order origin
-            # 2. Distance from order origin to destination
-            unassigned_orders.sort(
-                key=lambda o: (
-                    manhattan_distance(courier.location, o.origin),
-                    manhattan_distance(o.origin, o.destination)
-                )
+        # Find the nearest unassigned order in a single pass, keeping every
+        # order that ties on the priority:
+        # 1. Distance from courier to order origin
+        # 2. Distance from order origin to destination
+        # Orders held by another courier ('assigned' or 'in_transit') are not available
+        best_key = None
+        nearest_orders = []
+        for order in order_list:
+            if order.status != 'pending':
+                continue
+
+            key = (
+                manhattan_distance(courier.location, order.origin),
+                manhattan_distance(order.origin, order.destination)
             )
-
-            # Select the nearest order based on the defined priority
-            nearest_order = unassigned_orders[0]
+            if best_key is None or key < best_key:
+                best_key = key
+                nearest_orders = [order]
+            elif key == best_key:
+                nearest_orders.append(order)
+
+        if nearest_orders:
+            # Select uniformly among the nearest orders; one draw instead of a shuffle
+            if len(nearest_orders) == 1:
+                nearest_order = nearest_orders[0]
+            else:
+                nearest_order = (rng or random).choice(nearest_orders)
 
             # Assign the order to the courier
             courier.current_order = nearest_order
@@ -45,43 +56,46 @@ def assign_order_to_courier(order_list, courier):
             logging.debug(f"Courier at {courier.location} assigned to order {nearest_order.origin} -> {nearest_order.destination}")
         
 
-def process_orders(order_list, couriers):
+def process_orders(order_list, couriers, rng=None):
     """
     Assigns orders to all available couriers.
 
     Parameters:
     - order_list (list): List of Order objects.
     - couriers (list): List of Courier objects.
+    - rng (RandomStream): Stream used to break ties. The global random module
+      is used if None.
 
     Returns:
     - None
     """
     for courier in couriers:
-        assign_order_to_courier(order_list, courier)
+        assign_order_to_courier(order_list, courier, rng)
 
-def update_order_patience(order_list):
+def update_order_patience(order_list, on_timeout=None):
     """
     Updates the patience of each order and applies penalties for timed-out orders.
 
     Parameters:
     - order_list (list): List of Order objects.
+    - on_timeout (callable): Called with each order that times out.
 
     Returns:
     - timed_out_count (int): Number of orders that have timed out.
     """
-    timed_out_orders = []
     timed_out_count = 0
 
     for order in order_list:
         order.patience -= 1
         if order.patience <= 0:
-            timed_out_orders.append(order)
             timed_out_count += 1
             logging.debug(f"Order {order.origin} -> {order.destination} timed out.")
+            if on_timeout is not None:
+                on_timeout(order)
 
     # Remove timed-out orders from the order list
-    for order in timed_out_orders:
-        order_list.remove(order)
+    if timed_out_count > 0:
+        order_list[:] = [order for order in order_list if order.patience > 0]
 
     return timed_out_count
 
@@ -124,7 +138,7 @@ def generate_origin_destination_probs(grid_length):
     return origin_prob, destination_prob
 
 
-def generate_orders(num_orders, grid_length, patience=10):
+def generate_orders(num_orders, grid_length, patience=10, rng=None):
     """
     Generates a specified number of orders with random origins and destinations based on varying grid cell probabilities.
     
@@ -132,6 +146,8 @@ def generate_orders(num_orders, grid_length, patience=10):
     - num_orders (int): Number of orders to generate.
     - grid_length (int): Length of the grid (assuming square grid).
     - patience (int): Patience duration for each order.
+    - rng (RandomStream): Stream to draw the orders from. The global random
+      module is used if None.
     
     Returns:
     - orders (list): List of generated Order objects.
@@ -143,6 +159,21 @@ def generate_orders(num_orders, grid_length, patience=10):
     grid_cells = [(x, y) for x in range(grid_length) for y in range(grid_length)]
     origin_prob_flat = origin_prob.flatten()
     destination_prob_flat = destination_prob.flatten()
+
+    if rng is not None:
+        # Draw all origins and destinations in one call each, then redraw
+        # only the destinations that coincide with their origin
+        origins = rng.generator.choice(len(grid_cells), size=num_orders, p=origin_prob_flat)
+        destinations = rng.generator.choice(len(grid_cells), size=num_orders, p=destination_prob_flat)
+        clashes = np.flatnonzero(origins == destinations)
+        while clashes.size:
+            destinations[clashes] = rng.generator.choice(len(grid_cells), size=clashes.size, p=destination_prob_flat)
+            clashes = clashes[origins[clashes] == destinations[clashes]]
+
+        return [
+            Order(origin=grid_cells[o], destination=grid_cells[d], patience=patience)
+            for o, d in zip(origins.tolist(), destinations.tolist())
+        ]
     
     # Generate orders
     orders = []
@@ -172,4 +203,4 @@ def generate_orders(num_orders, grid_length, patience=10):
         # Create and append the Order
         orders.append(Order(origin=origin, destination=destination, patience=patience))
     
-    return orders
\ No newline at end of file
+    return orders
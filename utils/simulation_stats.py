@@ -0,0 +1,125 @@
+import numpy as np
+
+
+class SimulationStats:
+    '''
+    Incremental statistics of a simulation run.
+
+    Counters are updated when an order changes status (assignment, pick-up,
+    delivery, reject, timeout) instead of rescanning the order list, so the
+    termination check is O(1). At the end of every tick the queue length,
+    the number of idle couriers and percentiles of the age of the orders
+    waiting in the queue are written to preallocated per-tick buffers.
+
+    An order is open until it is delivered or times out. Events of an order
+    that is already closed (e.g. a courier delivering an order after it timed
+    out) are ignored.
+    '''
+    def __init__(self, order_list, couriers, max_steps):
+        self.num_orders = len(order_list)
+        self.open_orders = len(order_list)
+        self.idle_couriers = sum(1 for courier in couriers if courier.current_order is None)
+
+        self.assignments = 0
+        self.picked_up = 0
+        self.delivered = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+        # Tick at which each queued order entered the queue
+        self.waiting_since = {order: 0 for order in order_list if order.status == 'pending'}
+        self.closed = set()
+
+        self.num_ticks = 0
+        self.queue_length = np.zeros(max_steps, dtype=np.int64)
+        self.idle_courier_count = np.zeros(max_steps, dtype=np.int64)
+        self.delivered_count = np.zeros(max_steps, dtype=np.int64)
+        self.order_age_p50 = np.zeros(max_steps, dtype=np.float64)
+        self.order_age_p90 = np.zeros(max_steps, dtype=np.float64)
+        self.order_age_max = np.zeros(max_steps, dtype=np.float64)
+
+    def record_assignment(self, order):
+        if order in self.closed:
+            return
+        self.assignments += 1
+        self.idle_couriers -= 1
+        self.waiting_since.pop(order, None)
+
+    def record_pick_up(self, order):
+        if order in self.closed:
+            return
+        self.picked_up += 1
+
+    def record_delivery(self, order):
+        # The courier becomes idle even if the order was already closed
+        self.idle_couriers += 1
+        if order in self.closed:
+            return
+        self.delivered += 1
+        self._close(order)
+
+    def record_reject(self, order, tick):
+        self.idle_couriers += 1
+        if order in self.closed:
+            return
+        self.rejected += 1
+        # The order goes back to the queue
+        self.waiting_since[order] = tick
+
+    def record_timeout(self, order):
+        if order in self.closed:
+            return
+        self.timed_out += 1
+        self._close(order)
+
+    def _close(self, order):
+        self.open_orders -= 1
+        self.closed.add(order)
+        self.waiting_since.pop(order, None)
+
+    def all_orders_processed(self):
+        '''
+        Returns True once every order has been delivered or has timed out.
+        '''
+        return self.open_orders == 0
+
+    def end_tick(self, tick):
+        '''
+        Writes the per-tick series for tick (0-based).
+        '''
+        self.queue_length[tick] = len(self.waiting_since)
+        self.idle_courier_count[tick] = self.idle_couriers
+        self.delivered_count[tick] = self.delivered
+
+        if self.waiting_since:
+            ages = tick + 1 - np.fromiter(self.waiting_since.values(), dtype=np.float64, count=len(self.waiting_since))
+            self.order_age_p50[tick], self.order_age_p90[tick], self.order_age_max[tick] = np.percentile(ages, [50, 90, 100])
+
+        self.num_ticks = tick + 1
+
+    def time_series(self):
+        '''
+        Returns the per-tick series recorded so far.
+
+        Returns:
+        - series: Dictionary mapping series names to arrays of length num_ticks.
+        '''
+        n = self.num_ticks
+        return {
+            'Queue Length': self.queue_length[:n],
+            'Idle Couriers': self.idle_courier_count[:n],
+            'Delivered Orders': self.delivered_count[:n],
+            'Order Age p50': self.order_age_p50[:n],
+            'Order Age p90': self.order_age_p90[:n],
+            'Order Age Max': self.order_age_max[:n]
+        }
+
+    def summary(self):
+        return {
+            'Delivered Orders': self.delivered,
+            'Rejected Orders': self.rejected,
+            'Timed-out Orders': self.timed_out,
+            'Picked-up Orders': self.picked_up,
+            'Assignments': self.assignments,
+            'Steps': self.num_ticks
+        }
@@ -1,9 +1,11 @@
 import random
 import logging
 from core.order import Order
-from utils.order_utils import process_orders, update_order_patience
+from utils.order_utils import assign_order_to_courier, update_order_patience
+from utils.simulation_stats import SimulationStats
 from learning.policy import epsilon_greedy
 from core.action import take_action
+from core.compiled_env import ACTION_CODES, CompiledGrid, take_action_compiled
 
 
 def generate_orders(num_orders, grid_length, patience=10):
@@ -28,7 +30,7 @@ def generate_orders(num_orders, grid_length, patience=10):
     return orders
 
 
-def simulate_couriers(couriers, order_list, q_table, grid_size=5, m=5, max_steps=100):
+def simulate_couriers(couriers, order_list, q_table, grid_size=5, m=5, max_steps=100, rng=None, stats=None, compiled=False):
     '''
     Simulates the actions of multiple couriers using the trained Q-table.
 
@@ -39,64 +41,82 @@ def simulate_couriers(couriers, order_list, q_table, grid_size=5, m=5, max_steps
     - grid_size (int): Size of the grid (assuming square grid).
     - m (int/float): Parameter controlling reward magnitudes, proportional to grid size.
     - max_steps (int): Maximum number of steps in the simulation.
+    - rng (RandomStream): Stream for tie-breaks. The global random module is
+      used if None.
+    - stats (SimulationStats): Collector for the run's counters and per-tick
+      series. A new one is created if None; pass one (created with at least
+      max_steps ticks) to read its time series after the run.
+    - compiled (bool): Step the environment with the precomputed tables of
+      core.compiled_env instead of take_action.
 
     Returns:
     - summary: Dictionary containing summary statistics.
     '''
+    if stats is None:
+        stats = SimulationStats(order_list, couriers, max_steps)
+    assert len(stats.queue_length) >= max_steps, "stats must be created with at least max_steps ticks"
+
+    grid = CompiledGrid(m) if compiled else None
     total_reward = 0
-    delivered_orders = 0
-    rejected_orders = 0
-    timed_out_orders = 0
-    initial_num_orders = len(order_list)
 
     for step in range(max_steps):
         # Assign orders to couriers if they are not busy
-        process_orders(order_list, couriers)
+        for courier in couriers:
+            previous_order = courier.current_order
+            assign_order_to_courier(order_list, courier, rng)
+            if courier.current_order is not previous_order:
+                stats.record_assignment(courier.current_order)
 
         for idx, courier in enumerate(couriers):
-            if not courier.is_busy and courier.current_order is None:
-                # Get the current state
-                state = (
-                    courier.location,
-                    courier.current_order.origin if courier.current_order else None,
-                    courier.current_order.destination if courier.current_order else None
-                )
-
-                # Choose an action using the epsilon-greedy policy with epsilon=0 (pure exploitation)
-                action = epsilon_greedy(state, q_table, epsilon=0)
-
-                # Execute the action and observe the next state and reward
+            # Get the current state
+            state = (
+                courier.location,
+                courier.current_order.origin if courier.current_order else None,
+                courier.current_order.destination if courier.current_order else None
+            )
+
+            # Choose an action using the epsilon-greedy policy with epsilon=0 (pure exploitation)
+            action = epsilon_greedy(state, q_table, epsilon=0, rng=rng)
+
+            # Execute the action and observe the next state and reward
+            order = courier.current_order
+            was_picked_up = order.assigned if order else False
+            if compiled:
+                next_state, reward = take_action_compiled(courier, ACTION_CODES[action], order_list, grid)
+            else:
                 next_state, reward = take_action(courier, action, order_list, m)
 
-                total_reward += reward
+            total_reward += reward
+
+            # Record the status change caused by the action, if any
+            if order is not None:
+                if courier.current_order is None:
+                    if action == 'deliver':
+                        stats.record_delivery(order)
+                    else:
+                        stats.record_reject(order, step)
+                elif order.assigned and not was_picked_up:
+                    stats.record_pick_up(order)
 
-                # Show the courier's action, location, reward, and Q-value at each step
-                q_value = q_table.get((state, action), 0)
-                logging.debug(f"Courier {idx + 1}, Step {step + 1}: Action: {action}, Location: {courier.location}, Reward: {reward}, Q-value: {q_value}")
+            # Show the courier's action, location, reward, and Q-value at each step
+            q_value = q_table.get((state, action), 0)
+            logging.debug(f"Courier {idx + 1}, Step {step + 1}: Action: {action}, Location: {courier.location}, Reward: {reward}, Q-value: {q_value}")
 
         # Update order patience and apply penalties for timed-out orders
-        timed_out_count = update_order_patience(order_list, m)
+        timed_out_count = update_order_patience(order_list, on_timeout=stats.record_timeout)
         if timed_out_count > 0:
             penalty = timed_out_count * m
             total_reward -= penalty
-            timed_out_orders += timed_out_count
             logging.debug(f"Applied penalty for {timed_out_count} timed-out order(s): -{penalty}")
 
-        # Collect statistics
-        delivered_orders = sum(1 for order in order_list if order.status == 'delivered')
-        rejected_orders = sum(1 for order in order_list if order.status == 'rejected')
+        stats.end_tick(step)
 
-        # Check for terminal conditions (e.g., all orders delivered or timed out)
-        if all(order.status in ['delivered', 'rejected', 'timed_out'] for order in order_list):
+        # Check for terminal conditions (all orders delivered or timed out)
+        if stats.all_orders_processed():
             logging.debug(f"All orders have been processed by step {step + 1}.")
             break
 
-    summary = {
-        'Total Reward': total_reward,
-        'Delivered Orders': delivered_orders,
-        'Rejected Orders': rejected_orders,
-        'Timed-out Orders': timed_out_orders
-    }
+    summary = {'Total Reward': total_reward, **stats.summary()}
 
     logging.info(f"\nSimulation Summary: {summary}")
-    return summary
\ No newline at end of file
+    return summary